@@ -1,25 +1,37 @@
 """Database classes and support for measurements"""
 
 from abc import ABC
+import io
 import json
 import logging
 import os
 import re
 import sys
-import time
 import numpy as np
 from typing import Tuple
 
+from google.api_core.exceptions import GoogleAPIError
 from google.cloud import bigquery
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 logging.basicConfig(level=logging.INFO)
 
+# Cached Big Query client, creating one is not for free
+_BIGQUERY_CLIENT = None
+
+# Connection pool for the Azure backend, avoids a TCP+TDS handshake
+# for every connection request
+_MSSQL_POOL = None
+
 
 def get_database(style: str):
     """Retrieve database to the database to be used
     Returns database client, database object, Integer type to be used
     and a connection object (for Azure)
     """
+    global _BIGQUERY_CLIENT
+    global _MSSQL_POOL
 
     conn = None
     if style == "ms":
@@ -30,15 +42,27 @@ def get_database(style: str):
         password = "not_here"
 
         import pymssql
+        from sqlalchemy.pool import QueuePool
+
+        if _MSSQL_POOL is None:
+            _MSSQL_POOL = QueuePool(
+                lambda: pymssql.connect(server, username, password, database),
+                pool_size=5,
+                max_overflow=10,
+                recycle=3600,
+            )
 
-        conn = pymssql.connect(server, username, password, database)
+        # Callers close() the connection to return it to the pool
+        conn = _MSSQL_POOL.connect()
         client = conn.cursor(as_dict=True)
         dbo = "dbo"
         integer = "INTEGER"
 
     elif style == "google":
         logging.info("Using Google Big Query backend")
-        client = bigquery.Client()
+        if _BIGQUERY_CLIENT is None:
+            _BIGQUERY_CLIENT = bigquery.Client()
+        client = _BIGQUERY_CLIENT
         dbo = "ADataSet"
         integer = "INT64"
 
@@ -138,9 +162,61 @@ def get_database(style: str):
 #     myquery(client, f"drop table {dbo}.{cpu_hist_table}")
 
 
+def read_files(paths):
+    """Read a batch of measurement files in one pass.
+
+    Returns a dict mapping path to the file content, or None when a
+    file does not exist. Each file is read with a single bulk read so
+    the I/O phase stays separate from the parsing phase.
+    """
+    contents = {}
+    for path in paths:
+        try:
+            with open(path) as thefile:
+                contents[path] = thefile.read()
+        except FileNotFoundError as err:
+            logging.warning("File not found, skipping for now! %s", str(err))
+            contents[path] = None
+    return contents
+
+
+def list_output_files(lake, folder, testname):
+    """List the files in the two possible output folders of a test run.
+    One directory scan per folder replaces one stat syscall per
+    candidate file. Returns the plain and the analytics listing.
+    """
+    listing = []
+    for subdir in (
+        f"{lake}/{folder}/PySys/{testname}/Output/linux",
+        f"{lake}/{folder}/PySys/analytics/{testname}/Output/linux",
+    ):
+        try:
+            with os.scandir(subdir) as entries:
+                listing.append({entry.name for entry in entries})
+        except FileNotFoundError:
+            listing.append(set())
+    return listing[0], listing[1]
+
+
+# Column names of the measurement tables, used to build the json rows
+# for upload in one go instead of per-row dict construction
+CPU_KEYS = ("id", "mid", "sample", "utime", "stime", "cutime", "cstime")
+MEM_KEYS = ("id", "mid", "sample", "size", "resident", "shared", "text", "data")
+METADATA_KEYS = ("id", "mid", "date", "url", "name", "branch")
+
+# Map a stat snapshot filename to the utime and stime rrd export names
+# of the matching collectd measurement
+_RRD_NAME_MAP = {
+    "stat_mapper_stdout": ("gauge-mapper-c8y-utime", "gauge-mapper-c8y-stime"),
+    "stat_mosquitto_stdout": ("gauge-mosquitto-utime", "gauge-mosquitto-stime"),
+}
+
+
 class MeasurementBase(ABC):
     """Abstract base class for type Measurements"""
 
+    _FOLDER_RE = re.compile(r"^results_(\d+)_unpack$")
+
     def __init__(self, lake, name, data_amount, data_length, client, testmode):
 
         # Amount of columns in the table
@@ -153,7 +229,7 @@ class MeasurementBase(ABC):
 
         self.client = client
         self.lake = lake
-        self.json_data = None
+        self.columns = None
         self.job_config = None
 
         if testmode:
@@ -179,30 +255,60 @@ class MeasurementBase(ABC):
         except:  # TODO: Can' import this google.api_core.exceptions.NotFound:
             pass
 
+    def arrow_table(self):
+        """Convert the staged columns into an Arrow table"""
+        schema = None
+        if self.job_config is not None and self.job_config.schema:
+            schema = pa.schema(
+                [
+                    (
+                        field.name,
+                        # The measurement matrices are int32, ship the
+                        # columns at that width and let BigQuery widen
+                        # them to INT64 on load
+                        pa.int32() if field.field_type == "INT64" else pa.string(),
+                    )
+                    for field in self.job_config.schema
+                ]
+            )
+        # The int32 matrix columns are contiguous (order="F") and are
+        # wrapped without a copy
+        return pa.Table.from_pydict(self.columns, schema=schema)
+
+    def start_upload(self):
+        """Submit the load job for this table and return it without waiting"""
+
+        buffer = io.BytesIO()
+        pq.write_table(self.arrow_table(), buffer)
+        buffer.seek(0)
+
+        return self.client.load_table_from_file(
+            buffer,
+            self.database,
+            job_config=bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.PARQUET
+            ),
+        )
+
     def upload_table(self):
-        """Upload table to online database"""
+        """Upload table to online database as a Parquet load job"""
 
         if self.client:
-            load_job = self.client.load_table_from_json(
-                self.json_data,
-                self.database,
-                job_config=self.job_config,
-            )
-
-            while load_job.running():
-                time.sleep(0.5)
-                logging.info("Waiting")
+            load_job = self.start_upload()
 
-            if load_job.errors:
+            try:
+                # Polls with exponential backoff and returns as soon as
+                # the job is done
+                load_job.result(timeout=600)
+            except GoogleAPIError:
                 logging.error("Error %s", load_job.error_result)
                 logging.error(load_job.errors)
                 raise SystemError
 
-    @staticmethod
-    def foldername_to_index(foldername: str) -> int:
+    @classmethod
+    def foldername_to_index(cls, foldername: str) -> int:
         """Convert results_N_unpack into N"""
-        reg = re.compile(r"^results_(\d+)_unpack$")
-        match = reg.match(foldername)
+        match = cls._FOLDER_RE.match(foldername)
 
         if match:
             index = int(match.group(1))
@@ -215,14 +321,20 @@ class MeasurementBase(ABC):
 class MeasurementMetadata(MeasurementBase):
     """Class to represent a table of measurement metadata"""
 
+    SCHEMA = [
+        bigquery.SchemaField("id", "INT64"),
+        bigquery.SchemaField("mid", "INT64"),
+        bigquery.SchemaField("date", "STRING"),
+        bigquery.SchemaField("url", "STRING"),
+        bigquery.SchemaField("name", "STRING"),
+        bigquery.SchemaField("branch", "STRING"),
+    ]
+    JOB_CONFIG = bigquery.LoadJobConfig(schema=SCHEMA)
+
     def __init__(self, lake, name, data_amount, data_length, client, testmode):
 
         super().__init__(lake, name, data_amount, data_length, client, testmode)
-        self.array = np.zeros((self.size, 7), dtype=np.int32)
-        self.row_id = 0
-
         self.array = []
-        self.client = client
 
     def scrap_data(self, file: str) -> Tuple[str, str, str, str, str]:
         """Read measurement data from file"""
@@ -266,30 +378,12 @@ class MeasurementMetadata(MeasurementBase):
 
         self.delete_table()
 
-        self.job_config = bigquery.LoadJobConfig(
-            schema=[
-                bigquery.SchemaField("id", "INT64"),
-                bigquery.SchemaField("mid", "INT64"),
-                bigquery.SchemaField("date", "STRING"),
-                bigquery.SchemaField("url", "STRING"),
-                bigquery.SchemaField("name", "STRING"),
-                bigquery.SchemaField("branch", "STRING"),
-            ],
-        )
+        self.job_config = self.JOB_CONFIG
 
-        self.json_data = []
-
-        for index in range(self.data_amount):
-            self.json_data.append(
-                {
-                    "id": self.array[index][0],
-                    "mid": self.array[index][1],
-                    "date": self.array[index][2],
-                    "url": self.array[index][3],
-                    "name": self.array[index][4],
-                    "branch": self.array[index][5],
-                }
-            )
+        cols = list(zip(*self.array))
+        if not cols:
+            cols = [()] * len(METADATA_KEYS)
+        self.columns = dict(zip(METADATA_KEYS, cols))
 
         self.upload_table()
 
@@ -297,10 +391,23 @@ class MeasurementMetadata(MeasurementBase):
 class CpuHistory(MeasurementBase):
     """Class to represent a table of measured CPU usage"""
 
+    SCHEMA = [
+        bigquery.SchemaField("id", "INT64"),
+        bigquery.SchemaField("mid", "INT64"),
+        bigquery.SchemaField("sample", "INT64"),
+        bigquery.SchemaField("utime", "INT64"),
+        bigquery.SchemaField("stime", "INT64"),
+        bigquery.SchemaField("cutime", "INT64"),
+        bigquery.SchemaField("cstime", "INT64"),
+    ]
+    JOB_CONFIG = bigquery.LoadJobConfig(schema=SCHEMA)
+
     def __init__(self, lake, name, data_amount, data_length, client, testmode):
 
         super().__init__(lake, name, data_amount, data_length, client, testmode)
-        self.array = np.zeros((self.size, 7), dtype=np.int32)
+        # Column-major layout so that the column slices used by show()
+        # and the staging code are contiguous in memory
+        self.array = np.zeros((self.size, 7), dtype=np.int32, order="F")
 
         # The current row index
         self.row_id = 0
@@ -331,61 +438,54 @@ class CpuHistory(MeasurementBase):
     def scrap_data_collectd(self, file_utime, file_stime, measurement_index):
         """Read measurement data from collectd export"""
 
-        sample = 0
-        try:
-            with open(file_utime) as thestats_utime:
-                with open(file_stime) as thestats_stime:
-                    lines_utime = thestats_utime.readlines()
-                    lines_stime = thestats_stime.readlines()
-
-                    assert len(lines_utime) == self.data_length
-                    assert len(lines_stime) == self.data_length
-
-                    for i in range(self.data_length):
-
-                        timestamp_utime, utime_str = lines_utime[i].split()
-                        timestamp_stime, stime_str = lines_stime[i].split()
-
-                        if timestamp_utime != timestamp_stime:
-                            print(
-                                f"Warning timestamps are not equal {timestamp_utime} and {timestamp_stime}"
-                            )
-
-                        if utime_str == "None":
-                            utime = 0
-                        else:
-                            utime = int(float(utime_str))
-
-                        if stime_str == "None":
-                            stime = 0
-                        else:
-                            stime = int(float(stime_str))
-
-                        cutime = (
-                            0  # glue cutime to zero, we do not have child processes
-                        )
-                        cstime = (
-                            0  # glue cstime to zero, we do not have child processes
-                        )
-
-                        self.insert_line(
-                            idx=self.row_id,
-                            mid=measurement_index,
-                            sample=sample,
-                            utime=utime,
-                            stime=stime,
-                            cutime=cutime,
-                            cstime=cstime,
-                        )
-                        sample += 1
-                        self.row_id += 1
-
-        except FileNotFoundError as err:
-            logging.warning("File not found, skipping for now! %s", str(err))
+        contents = read_files((file_utime, file_stime))
+        lines_utime = (contents[file_utime] or "").splitlines()
+        lines_stime = (contents[file_stime] or "").splitlines()
+
+        # Tolerate short exports and pad the tail with zeros, so a
+        # data size mismatch is handled even when running with -O
+        samples = min(len(lines_utime), len(lines_stime), self.data_length)
+        if samples < self.data_length:
+            logging.warning(
+                "Expected %s samples, got %s, padding with zeros",
+                self.data_length,
+                samples,
+            )
+        lines_utime = lines_utime[:samples]
+        lines_stime = lines_stime[:samples]
+
+        length = self.data_length
+        row = self.row_id
+        self.array[row : row + length, 0] = np.arange(row, row + length)
+        self.array[row : row + length, 1] = measurement_index
+        self.array[row : row + length, 2] = np.arange(length)
+        # glue cutime and cstime to zero, we do not have child processes
+        self.array[row : row + length, 3:7] = 0
+
+        if samples:
+            # Each line is "timestamp value", value can be the string None
+            cols_utime = np.array([line.split() for line in lines_utime])
+            cols_stime = np.array([line.split() for line in lines_stime])
+
+            mismatch = cols_utime[:, 0] != cols_stime[:, 0]
+            if mismatch.any():
+                print(f"Warning timestamps are not equal at {mismatch.sum()} samples")
+
+            utime = (
+                np.where(cols_utime[:, 1] == "None", "0", cols_utime[:, 1])
+                .astype(np.float64)
+                .astype(np.int32)
+            )
+            stime = (
+                np.where(cols_stime[:, 1] == "None", "0", cols_stime[:, 1])
+                .astype(np.float64)
+                .astype(np.int32)
+            )
 
-        missing = self.data_length - sample
+            self.array[row : row + samples, 3] = utime
+            self.array[row : row + samples, 4] = stime
 
-        assert missing == 0
+        self.row_id += length
 
     def scrap_data(self, thefile, measurement_index, binary):
         """Read measurement data from file /proc/pid/stat
@@ -393,65 +493,63 @@ class CpuHistory(MeasurementBase):
         See manpage proc ($ man proc) in section /proc/[pid]/stat for colum descriptions
         """
 
-        sample = 0
+        data = b""
         try:
-            with open(thefile) as thestats:
-                lines = thestats.readlines()
-                for line in lines:
-                    entries = line.split()
-                    # In some cases there some entries from /proc/stat here.
-                    # This can happen when the pid is not existing anymore
-                    # then /proc/pid/stat is evaluated to /proc/stat
-                    # We just filter here to match the right lines.
-                    if len(entries) == 52 and entries[1] == f"({binary})":
-                        # It can happen that there are 61 lines measured
-                        # e.g. in the 60s interval, we just ignore them
-                        if sample >= self.data_length:
-                            logging.warning(
-                                "Omitted a sample from mid %s", measurement_index
-                            )
-                            continue
-                        utime = int(entries[13])  # utime
-                        stime = int(entries[14])  # stime
-                        cutime = int(entries[15])  # cutime
-                        cstime = int(entries[16])  # cstime
-
-                        self.insert_line(
-                            idx=self.row_id,
-                            mid=measurement_index,
-                            sample=sample,
-                            utime=utime,
-                            stime=stime,
-                            cutime=cutime,
-                            cstime=cstime,
-                        )
-                        sample += 1
-                        self.row_id += 1
-
+            # One bulk read, the line split happens on the bytes buffer
+            # without decoding to str
+            with open(thefile, "rb") as thestats:
+                data = thestats.read()
         except FileNotFoundError as err:
             logging.warning("File not found, skipping for now! %s", str(err))
 
-        # In case that there are not enough lines in the file fix with zeros
-        # Can happen, depending on when the data recorder process is killed.
+        # In some cases there some entries from /proc/stat here.
+        # This can happen when the pid is not existing anymore
+        # then /proc/pid/stat is evaluated to /proc/stat
+        # We just filter here to match the right lines.
+        token = f"({binary})".encode()
+        entries = [line.split() for line in data.splitlines()]
+        entries = [e for e in entries if len(e) == 52 and e[1] == token]
+
+        # It can happen that there are 61 lines measured
+        # e.g. in the 60s interval, we just ignore them
+        if len(entries) > self.data_length:
+            logging.warning(
+                "Omitted %s samples from mid %s",
+                len(entries) - self.data_length,
+                measurement_index,
+            )
+            entries = entries[: self.data_length]
 
-        missing = self.data_length - sample
+        # utime, stime, cutime, cstime
+        parsed = np.array(
+            [(e[13], e[14], e[15], e[16]) for e in entries], dtype=np.int32
+        ).reshape(len(entries), 4)
 
-        for miss in range(missing):
-            self.insert_line(
-                idx=self.row_id,
-                mid=measurement_index,
-                sample=sample,
-                utime=0,
-                stime=0,
-                cutime=0,
-                cstime=0,
-            )
-            sample += 1
-            self.row_id += 1
+        # In case that there are not enough lines in the file fix with zeros
+        # Can happen, depending on when the data recorder process is killed.
+        samples = self.data_length
+        row = self.row_id
+        self.array[row : row + samples, 0] = np.arange(row, row + samples)
+        self.array[row : row + samples, 1] = measurement_index
+        self.array[row : row + samples, 2] = np.arange(samples)
+        self.array[row : row + samples, 3:7] = 0
+        self.array[row : row + len(entries), 3:7] = parsed
+        self.row_id += samples
 
     def postprocess(self, folders, testname, filename, binary):
 
         """Postprocess all relevant folders"""
+        if filename not in _RRD_NAME_MAP:
+            raise SystemError("Cannot convert filename %s" % filename)
+
+        filename_rrd1, filename_rrd2 = _RRD_NAME_MAP[filename]
+
+        # Shape the matrix to the actual folder list, data_amount from
+        # construction time is only an upper bound
+        self.size = len(folders) * self.data_length
+        self.array = np.zeros((self.size, 7), dtype=np.int32, order="F")
+        self.row_id = 0
+
         for folder in folders:
             index = self.foldername_to_index(folder)
 
@@ -459,16 +557,6 @@ class CpuHistory(MeasurementBase):
                 f"{self.lake}/{folder}/PySys/{testname}/Output/linux/{filename}.out"
             )
 
-            if filename == "stat_mapper_stdout":
-                filename_rrd1 = "gauge-mapper-c8y-utime"
-                filename_rrd2 = "gauge-mapper-c8y-stime"
-            elif filename == "stat_mosquitto_stdout":
-                filename_rrd1 = "gauge-mosquitto-utime"
-                filename_rrd2 = "gauge-mosquitto-stime"
-            else:
-
-                raise SystemError("Cannot convert filename %s" % filename)
-
             rrdfile1 = f"{self.lake}/{folder}/PySys/analytics/{testname}/Output/linux/{filename_rrd1}.rrd.txt"
             rrdfile2 = f"{self.lake}/{folder}/PySys/analytics/{testname}/Output/linux/{filename_rrd2}.rrd.txt"
 
@@ -476,11 +564,13 @@ class CpuHistory(MeasurementBase):
             rrdfile1_old = f"{self.lake}/{folder}/PySys/{testname}/Output/linux/{filename_rrd1}.rrd.txt"
             rrdfile2_old = f"{self.lake}/{folder}/PySys/{testname}/Output/linux/{filename_rrd2}.rrd.txt"
 
-            if os.path.exists(statsfile):
+            plain, analytics = list_output_files(self.lake, folder, testname)
+
+            if f"{filename}.out" in plain:
                 self.scrap_data(statsfile, index, binary)
-            elif os.path.exists(rrdfile1):
+            elif f"{filename_rrd1}.rrd.txt" in analytics:
                 self.scrap_data_collectd(rrdfile1, rrdfile2, index)
-            elif os.path.exists(rrdfile1_old):
+            elif f"{filename_rrd1}.rrd.txt" in plain:
                 self.scrap_data_collectd(rrdfile1_old, rrdfile2_old, index)
             else:
                 # breakpoint()
@@ -517,32 +607,9 @@ class CpuHistory(MeasurementBase):
         logging.info("Updating table: %s", self.name)
         self.delete_table()
 
-        self.job_config = bigquery.LoadJobConfig(
-            schema=[
-                bigquery.SchemaField("id", "INT64"),
-                bigquery.SchemaField("mid", "INT64"),
-                bigquery.SchemaField("sample", "INT64"),
-                bigquery.SchemaField("utime", "INT64"),
-                bigquery.SchemaField("stime", "INT64"),
-                bigquery.SchemaField("cutime", "INT64"),
-                bigquery.SchemaField("cstime", "INT64"),
-            ],
-        )
+        self.job_config = self.JOB_CONFIG
 
-        self.json_data = []
-
-        for i in range(self.size):
-            self.json_data.append(
-                {
-                    "id": int(self.array[i, 0]),
-                    "mid": int(self.array[i, 1]),
-                    "sample": int(self.array[i, 2]),
-                    "utime": int(self.array[i, 3]),
-                    "stime": int(self.array[i, 4]),
-                    "cutime": int(self.array[i, 5]),
-                    "cstime": int(self.array[i, 6]),
-                }
-            )
+        self.columns = {key: self.array[:, i] for i, key in enumerate(CPU_KEYS)}
 
         self.upload_table()
 
@@ -552,37 +619,42 @@ class CpuHistoryStacked(MeasurementBase):
     The graph contains user and system cpu time for the last N test-runs.
     """
 
+    history = 10  # process the last 10 test runs
+    fields = [
+        ("id", "INT64"),
+        ("t0u", "INT64"),
+        ("t0s", "INT64"),
+        ("t1u", "INT64"),
+        ("t1s", "INT64"),
+        ("t2u", "INT64"),
+        ("t2s", "INT64"),
+        ("t3u", "INT64"),
+        ("t3s", "INT64"),
+        ("t4u", "INT64"),
+        ("t4s", "INT64"),
+        ("t5u", "INT64"),
+        ("t5s", "INT64"),
+        ("t6u", "INT64"),
+        ("t6s", "INT64"),
+        ("t7u", "INT64"),
+        ("t7s", "INT64"),
+        ("t8u", "INT64"),
+        ("t8s", "INT64"),
+        ("t9u", "INT64"),
+        ("t9s", "INT64"),
+    ]
+    SCHEMA = [bigquery.SchemaField(name, kind) for name, kind in fields]
+    JOB_CONFIG = bigquery.LoadJobConfig(schema=SCHEMA)
+
     def __init__(self, lake, name, data_amount, data_length, client, testmode):
 
         super().__init__(lake, name, data_amount, data_length, client, testmode)
 
         self.row_id = 0
 
-        self.history = 10  # process the last 10 test runs
-        self.fields = [
-            ("id", "INT64"),
-            ("t0u", "INT64"),
-            ("t0s", "INT64"),
-            ("t1u", "INT64"),
-            ("t1s", "INT64"),
-            ("t2u", "INT64"),
-            ("t2s", "INT64"),
-            ("t3u", "INT64"),
-            ("t3s", "INT64"),
-            ("t4u", "INT64"),
-            ("t4s", "INT64"),
-            ("t5u", "INT64"),
-            ("t5s", "INT64"),
-            ("t6u", "INT64"),
-            ("t6s", "INT64"),
-            ("t7u", "INT64"),
-            ("t7s", "INT64"),
-            ("t8u", "INT64"),
-            ("t8s", "INT64"),
-            ("t9u", "INT64"),
-            ("t9s", "INT64"),
-        ]
-        self.array = np.zeros((self.data_length, len(self.fields)), dtype=np.int32)
+        self.array = np.zeros(
+            (self.data_length, len(self.fields)), dtype=np.int32, order="F"
+        )
 
     def postprocess(
         self,
@@ -593,28 +665,20 @@ class CpuHistoryStacked(MeasurementBase):
         mlen = len(measurement_folders)
 
         # Set the id in the first column
-        for index in range(self.data_length):
-            self.array[index, 0] = index
+        self.array[:, 0] = np.arange(self.data_length)
 
         processing_range = min(mlen, self.history)
-        column = 1
 
-        # Iterate backwards through the measurement list
-        for measurement in range(mlen - 1, mlen - processing_range - 1, -1):
-
-            for index in range(self.data_length):
-
-                # Read user time from the cpu_table
-                self.array[index, column] = cpu_array.array[
-                    measurement * self.data_length + index, 3
-                ]
-
-                # Read system time from the cpu_table
-                self.array[index, column + 1] = cpu_array.array[
-                    measurement * self.data_length + index, 4
-                ]
+        # User and system time of all measurements from the cpu_table,
+        # one block per measurement, newest measurement first
+        times = cpu_array.array[: mlen * self.data_length, 3:5].reshape(
+            mlen, self.data_length, 2
+        )
+        selected = times[mlen - processing_range :][::-1]
 
-            column += 2
+        # Interleave user and system time into the tNu/tNs columns
+        self.array[:, 1 : 1 + 2 * processing_range : 2] = selected[:, :, 0].T
+        self.array[:, 2 : 2 + 2 * processing_range : 2] = selected[:, :, 1].T
 
     def insert_line(self, line, idx):
         """Insert a line into the table"""
@@ -644,19 +708,11 @@ class CpuHistoryStacked(MeasurementBase):
         logging.info("Updating table: %s", self.name)
         self.delete_table()
 
-        schema = []
-        for i in range(len(self.fields)):
-            schema.append(bigquery.SchemaField(self.fields[i][0], self.fields[i][1]))
-
-        self.job_config = bigquery.LoadJobConfig(schema=schema)
-
-        self.json_data = []
+        self.job_config = self.JOB_CONFIG
 
-        for i in range(self.data_length):
-            line = {}
-            for j in range(len(self.fields)):
-                line[self.fields[j][0]] = int(self.array[i, j])
-            self.json_data.append(line)
+        self.columns = {
+            field[0]: self.array[:, i] for i, field in enumerate(self.fields)
+        }
 
         self.upload_table()
 
@@ -664,13 +720,25 @@ class CpuHistoryStacked(MeasurementBase):
 class MemoryHistory(MeasurementBase):
     """Class to represent a table of measured memory"""
 
+    SCHEMA = [
+        bigquery.SchemaField("id", "INT64"),
+        bigquery.SchemaField("mid", "INT64"),
+        bigquery.SchemaField("sample", "INT64"),
+        bigquery.SchemaField("size", "INT64"),
+        bigquery.SchemaField("resident", "INT64"),
+        bigquery.SchemaField("shared", "INT64"),
+        bigquery.SchemaField("text", "INT64"),
+        bigquery.SchemaField("data", "INT64"),
+    ]
+    JOB_CONFIG = bigquery.LoadJobConfig(schema=SCHEMA)
+
     def __init__(self, lake, name, data_amount, data_length, client, testmode):
         super().__init__(lake, name, data_amount, data_length, client, testmode)
 
         self.lake = lake
         self.size = self.size
         self.data_length = data_length
-        self.array = np.zeros((self.size, 8), dtype=np.int32)
+        self.array = np.zeros((self.size, 8), dtype=np.int32, order="F")
         self.client = client
         self.row_id = 0
 
@@ -697,110 +765,100 @@ class MemoryHistory(MeasurementBase):
             raise SystemError("Folder not existing %s" % thefolder)
 
         types = ["size", "resident", "shared", "text", "data"]
-        db = {"size": {}, "resident": {}, "shared": {}, "text": {}, "data": {}}
-
-        for idx, file in enumerate(types):
-            # Iterate through all rrd exports
-
-            myfile = f"gauge-mapper-c8y-{file}.rrd.txt"
-            thefile = os.path.join(thefolder, myfile)
-
-            try:
-                with open(thefile) as thestats:
-                    lines = thestats.readlines()
 
-                    assert len(lines) == self.data_length
-
-                    for index in range(len(lines)):
-                        timestamp, utime_str = lines[index].split()
-                        if utime_str == "None":
-                            utime_str = 0
-                        db[file][index] = (timestamp, utime_str)
-
-            except FileNotFoundError as err:
-                logging.warning("File not found, skipping for now! %s", str(err))
-
-        for sample in range(self.data_length):
-            # Warn if timestamps differ
-
-            size_stamp = int(float(db["size"][sample][0]))
-            resident_stamp = int(float(db["resident"][sample][0]))
-            shared_stamp = int(float(db["shared"][sample][0]))
-            text_stamp = int(float(db["text"][sample][0]))
-            data_stamp = int(float(db["data"][sample][0]))
-
-            if (
-                not size_stamp
-                == resident_stamp
-                == shared_stamp
-                == text_stamp
-                == data_stamp
-            ):
-                logging.info(
-                    "Warning: timestamps differ: %s %s %s %s %s"
-                    % (size_stamp, resident_stamp, shared_stamp, text_stamp, data_stamp)
+        paths = [
+            os.path.join(thefolder, f"gauge-mapper-c8y-{file}.rrd.txt")
+            for file in types
+        ]
+        contents = read_files(paths)
+
+        # One row per rrd export, each line is "timestamp value"
+        stamps = np.zeros((len(types), self.data_length), dtype=np.int64)
+        values = np.zeros((len(types), self.data_length), dtype=np.int32)
+
+        for idx, path in enumerate(paths):
+            lines = (contents[path] or "").splitlines()
+
+            # Tolerate short exports and leave the tail at zero, so a
+            # data size mismatch is handled even when running with -O
+            if len(lines) != self.data_length:
+                logging.warning(
+                    "Expected %s samples in %s, got %s",
+                    self.data_length,
+                    path,
+                    len(lines),
                 )
+                lines = lines[: self.data_length]
 
-        for sample in range(self.data_length):
+            if not lines:
+                continue
 
-            self.insert_line(
-                idx=self.row_id,
-                mid=measurement_index,
-                sample=sample,
-                size=int(float(db["size"][sample][1])),
-                resident=int(float(db["resident"][sample][1])),
-                shared=int(float(db["shared"][sample][1])),
-                text=int(float(db["text"][sample][1])),
-                data=int(float(db["data"][sample][1])),
+            cols = np.array([line.split() for line in lines])
+            stamps[idx, : len(lines)] = cols[:, 0].astype(np.float64).astype(np.int64)
+            values[idx, : len(lines)] = (
+                np.where(cols[:, 1] == "None", "0", cols[:, 1])
+                .astype(np.float64)
+                .astype(np.int32)
             )
-            self.row_id += 1
+
+        # Warn if timestamps differ between the five exports
+        mismatch = (stamps != stamps[0]).any(axis=0)
+        if mismatch.any():
+            logging.info("Warning: timestamps differ at %s samples", mismatch.sum())
+
+        samples = self.data_length
+        row = self.row_id
+        self.array[row : row + samples, 0] = np.arange(row, row + samples)
+        self.array[row : row + samples, 1] = measurement_index
+        self.array[row : row + samples, 2] = np.arange(samples)
+        self.array[row : row + samples, 3:8] = values.T
+        self.row_id += samples
 
     def scrap_data(self, thefile, measurement_index, arr):
         """Read measurement data from file"""
-        with open(thefile) as thestats:
-            lines = thestats.readlines()
-            sample = 0
-            for line in lines:
-                entries = line.split()
-                size = entries[0]  #     (1) total program size
-                resident = entries[1]  #   (2) resident set size
-                shared = entries[2]  #     (3) number of resident shared pages
-                text = entries[3]  #       (4) text (code)
-                # lib = entries[4] #      (5) library (unused since Linux 2.6; always 0)
-                data = entries[5]  #      (6) data + stack
-
-                arr.insert_line(
-                    idx=self.row_id,
-                    mid=measurement_index,
-                    sample=sample,
-                    size=size,
-                    resident=resident,
-                    shared=shared,
-                    text=text,
-                    data=data,
-                )
-                sample += 1
-                self.row_id += 1
+        with open(thefile, "rb") as thestats:
+            data = thestats.read()
+
+        # Columns of /proc/pid/statm:
+        # (1) total program size, (2) resident set size,
+        # (3) number of resident shared pages, (4) text (code),
+        # (5) library (unused since Linux 2.6; always 0), (6) data + stack
+        entries = [line.split() for line in data.splitlines()]
+        entries = [e[:6] for e in entries if e]
+
+        if len(entries) > self.data_length:
+            logging.warning(
+                "Omitted %s samples from mid %s",
+                len(entries) - self.data_length,
+                measurement_index,
+            )
+            entries = entries[: self.data_length]
 
-        logging.debug("Read %s Memory stats", sample)
-        missing = self.data_length - sample
-        for miss in range(missing):
+        parsed = np.array(entries, dtype=np.int32).reshape(len(entries), 6)
+        # drop the unused library column
+        parsed = parsed[:, [0, 1, 2, 3, 5]]
 
-            arr.insert_line(
-                idx=self.row_id,
-                mid=measurement_index,
-                sample=sample,
-                size=0,
-                resident=0,
-                shared=0,
-                text=0,
-                data=0,
-            )
-            sample += 1
-            self.row_id += 1
+        logging.debug("Read %s Memory stats", len(entries))
+
+        # Pad with zeros if there are not enough lines in the file
+        samples = self.data_length
+        row = self.row_id
+        arr.array[row : row + samples, 0] = np.arange(row, row + samples)
+        arr.array[row : row + samples, 1] = measurement_index
+        arr.array[row : row + samples, 2] = np.arange(samples)
+        arr.array[row : row + samples, 3:8] = 0
+        arr.array[row : row + len(entries), 3:8] = parsed
+        self.row_id += samples
 
     def postprocess(self, folders, testname, filename, binary):
         """Postprocess all relevant folders"""
+
+        # Shape the matrix to the actual folder list, data_amount from
+        # construction time is only an upper bound
+        self.size = len(folders) * self.data_length
+        self.array = np.zeros((self.size, 8), dtype=np.int32, order="F")
+        self.row_id = 0
+
         for folder in folders:
             index = self.foldername_to_index(folder)
 
@@ -808,26 +866,28 @@ class MemoryHistory(MeasurementBase):
                 f"{self.lake}/{folder}/PySys/{testname}/Output/linux/{filename}.out"
             )
 
-            # Select one of them to check if we measured with collectd
-            rrdfile = f"{self.lake}/{folder}/PySys/analytics/{testname}/Output/linux/gauge-mapper-c8y-resident.rrd.txt"
             rrdfolder = f"{self.lake}/{folder}/PySys/analytics/{testname}/Output/linux/"
 
             # After sorting tests into folders
-            rrdfile_old = f"{self.lake}/{folder}/PySys/{testname}/Output/linux/gauge-mapper-c8y-resident.rrd.txt"
             rrdfolder_old = f"{self.lake}/{folder}/PySys/{testname}/Output/linux/"
 
-            if os.path.exists(statsfile):
+            # Select one of them to check if we measured with collectd
+            sentinel = "gauge-mapper-c8y-resident.rrd.txt"
+
+            plain, analytics = list_output_files(self.lake, folder, testname)
+
+            if f"{filename}.out" in plain:
                 self.scrap_data(statsfile, index, self)
-            elif os.path.exists(rrdfile):
+            elif sentinel in analytics:
                 self.scrap_data_collectd(rrdfolder, index)
-            elif os.path.exists(rrdfile_old):
+            elif sentinel in plain:
                 self.scrap_data_collectd(rrdfolder_old, index)
             else:
                 # breakpoint()
                 # raise SystemError("File does not exist !!!")
                 logging.info(
-                    "Memory analytics does not exist !!! %s or %s"
-                    % (statsfile, rrdfile)
+                    "Memory analytics does not exist !!! %s or %s%s"
+                    % (statsfile, rrdfolder, sentinel)
                 )
                 logging.info("Filling with zeros")
                 self.scrap_zeros(index)
@@ -873,33 +933,8 @@ class MemoryHistory(MeasurementBase):
         """Create table and prepare loading via json and upload"""
         self.delete_table()
         logging.info("Updating table: %s", self.name)
-        self.job_config = bigquery.LoadJobConfig(
-            schema=[
-                bigquery.SchemaField("id", "INT64"),
-                bigquery.SchemaField("mid", "INT64"),
-                bigquery.SchemaField("sample", "INT64"),
-                bigquery.SchemaField("size", "INT64"),
-                bigquery.SchemaField("resident", "INT64"),
-                bigquery.SchemaField("shared", "INT64"),
-                bigquery.SchemaField("text", "INT64"),
-                bigquery.SchemaField("data", "INT64"),
-            ],
-        )
+        self.job_config = self.JOB_CONFIG
 
-        self.json_data = []
-
-        for i in range(self.size):
-            self.json_data.append(
-                {
-                    "id": int(self.array[i, 0]),
-                    "mid": int(self.array[i, 1]),
-                    "sample": int(self.array[i, 2]),
-                    "size": int(self.array[i, 3]),
-                    "resident": int(self.array[i, 4]),
-                    "shared": int(self.array[i, 5]),
-                    "text": int(self.array[i, 6]),
-                    "data": int(self.array[i, 6]),
-                }
-            )
+        self.columns = {key: self.array[:, i] for i, key in enumerate(MEM_KEYS)}
 
         self.upload_table()
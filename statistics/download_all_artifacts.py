@@ -27,58 +27,265 @@ import argparse
 import json
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from itertools import islice
+from urllib.parse import parse_qs, urlparse
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+
+
+def _make_session():
+    """Build the shared session so keep-alive reuses connections and
+    transient server errors are retried with backoff"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=16,
+        max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[502, 503, 504]),
+    )
+    session.mount("https://", adapter)
+    return session
+
+
+SESSION = _make_session()
+
+# Outdated artifact names from old test runs (many tries to get the
+# name right) that are repaired to results_<run_number>
+_REWRITE_NAMES = frozenset(
+    {"results_", "results_$RUN_NUMBER", "results", "results_$GITHUB_RUN_ID"}
+)
+
+# Shared header and URL templates, built once instead of per call
+HEADERS = {"Accept": "application/vnd.github.v3+json"}
+RUNS_URL = "https://api.github.com/repos/{user}/thin-edge.io/actions/runs"
+WORKFLOWS_URL = "https://api.github.com/repos/{user}/thin-edge.io/actions/workflows"
+WORKFLOW_RUNS_URL = (
+    "https://api.github.com/repos/{user}/thin-edge.io/actions/workflows/{workflow_id}/runs"
+)
+ARTIFACTS_URL = (
+    "https://api.github.com/repos/{user}/thin-edge.io/actions/runs/{runid}/artifacts"
+)
+
+# Guards the caches that the download workers share
+_CACHE_LOCK = threading.Lock()
+
+# GitHub purges artifacts after 90 days
+_RETENTION_DAYS = 90
+
+
+def ratelimited_get(url, **kwargs):
+    """GET through the shared session with rate-limit awareness.
+    Honours Retry-After on secondary limits and sleeps until the limit
+    resets when the request budget is nearly used up, instead of
+    failing mid-run with a JSON error body.
+    """
+    req = SESSION.get(url, **kwargs)
+
+    retry_after = req.headers.get("Retry-After")
+    if retry_after and str(retry_after).isdigit():
+        print(f"Secondary rate limit hit, sleeping {retry_after}s")
+        time.sleep(int(retry_after) + 1)
+        req = SESSION.get(url, **kwargs)
+
+    # Not every answer carries the rate limit headers
+    remaining = req.headers.get("X-RateLimit-Remaining")
+    if remaining is None:
+        return req
+
+    try:
+        remaining = int(remaining)
+        reset = int(req.headers.get("X-RateLimit-Reset", "0"))
+    except (TypeError, ValueError):
+        return req
 
+    if remaining < 5:
+        delay = max(0, reset - time.time()) + 1
+        print(f"Rate limit nearly exhausted, sleeping {delay:.0f}s")
+        time.sleep(delay)
 
-def download_artifact(url, name, run_number, token, lake, user, runner):
+    return req
+
+
+def download_artifact(url, name, run_number, token, lake, user, runner, existing_zips=None):
     """Download the artifact and store it as a zip file.
-    Also repair the filename if the name is outdated"""
+    Also repair the filename if the name is outdated.
+    With existing_zips the already-downloaded files are checked against
+    that set instead of one stat syscall per call.
+    """
 
-    headers = {"Accept": "application/vnd.github.v3+json"}
+    headers = HEADERS
 
     auth = HTTPBasicAuth(user, token)
 
     print(f"Will try {lake}/{name}.zip aka results_{run_number}'")
 
-    # Repair names from old test runs (many tries to the the name right)
+    # Repair names from old test runs with one set lookup
     if runner == 'run analytics':
         #name = f"{runner}_results_{run_number}"
         name = f"run_analytics_results_{run_number}"
-    elif name == "results_":
-        name = f"results_{run_number}"
-    elif name == "results_$RUN_NUMBER":
-        name = f"results_{run_number}"
-    elif name == "results":
-        name = f"results_{run_number}"
-    elif name == "results_$GITHUB_RUN_ID":
+    elif name in _REWRITE_NAMES:
         name = f"results_{run_number}"
     else:
         assert name == f"results_{run_number}"
 
     artifact_filename = f"{lake}/{name}.zip"
 
-    if os.path.exists(artifact_filename):
+    if existing_zips is None:
+        exists = os.path.exists(artifact_filename)
+    else:
+        exists = f"{name}.zip" in existing_zips
+
+    if exists:
         print(f"Skipped {lake}/{name}.zip")
         return False
 
-    req = requests.get(url, auth=auth, headers=headers, stream=True)
-
-    with open(os.path.expanduser(artifact_filename), "wb") as thefile:
-        for chunk in req.iter_content(chunk_size=128):
+    # Stream into a temp file and swap it in place at the end, so a
+    # died download never leaves a truncated zip under the final name
+    tmp_filename = os.path.expanduser(f"{artifact_filename}.part")
+
+    # Resume a dropped download from the bytes we already have, the
+    # S3-backed artifact urls support range requests
+    start = os.path.getsize(tmp_filename) if os.path.exists(tmp_filename) else 0
+    if start:
+        headers = dict(HEADERS)
+        headers["Range"] = f"bytes={start}-"
+        print(f"Resuming {lake}/{name}.zip at byte {start}")
+
+    req = ratelimited_get(url, auth=auth, headers=headers, stream=True)
+
+    # 416 on a resume means the part file already holds the whole
+    # artifact, a previous run died between the last chunk and the
+    # rename below. Swap it in place instead of crashing on it forever.
+    if start and req.status_code == 416:
+        os.replace(tmp_filename, os.path.expanduser(artifact_filename))
+        print(f"Downloaded {lake}/{name}.zip (part file was complete)")
+        if existing_zips is not None:
+            existing_zips.add(f"{name}.zip")
+        return True
+
+    # GitHub answers with a JSON error body e.g. for expired artifacts.
+    # Check status and content type once up front instead of sniffing
+    # every chunk for the error message.
+    req.raise_for_status()
+    if "application/json" in req.headers.get("Content-Type", ""):
+        raise SystemError(
+            "Something went wrong: We just drop off now. GH says expired !!!",
+            req.text,
+        )
 
-            if chunk.startswith(b'{"message"'):
-                raise SystemError("Something went wrong: We just drop off now. GH says expired !!!", chunk)
-                #raise SystemError("Something went wrong:", chunk)
+    # Only append when the server really answered the range request,
+    # a plain 200 carries the whole file again
+    resumed = start if start and req.status_code == 206 else 0
+    mode = "ab" if resumed else "wb"
 
+    with open(tmp_filename, mode) as thefile:
+        # Large chunks keep the interpreter and syscall overhead out of
+        # the write path
+        for chunk in req.iter_content(chunk_size=1 << 20):
             thefile.write(chunk)
-        print(f"Downloaded {lake}/{name}.zip")
+
+    try:
+        expected = int(req.headers.get("Content-Length", ""))
+    except (TypeError, ValueError):
+        expected = None
+
+    if expected is not None and os.path.getsize(tmp_filename) != resumed + expected:
+        raise SystemError("Truncated download %s" % tmp_filename)
+
+    os.replace(tmp_filename, os.path.expanduser(artifact_filename))
+    print(f"Downloaded {lake}/{name}.zip")
+
+    if existing_zips is not None:
+        # Keep concurrent workers from trying the same artifact again
+        existing_zips.add(f"{name}.zip")
 
     return True
 
 
-def get_artifacts_for_runid(runid, run_number, token, lake, user, runner):
-    """Download artifacts for a given runid"""
+def _read_etags(lake):
+    """Read the on-disk ETag cache, mapping url to the last seen ETag"""
+    path = os.path.expanduser(f"{lake}/etags.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as thefile:
+        return json.load(thefile)
+
+
+def _write_etags(lake, etags):
+    """Persist the ETag cache"""
+    try:
+        with open(os.path.expanduser(f"{lake}/etags.json"), "w") as thefile:
+            thefile.write(json.dumps(etags))
+    except OSError as err:
+        print(f"Cannot write etag cache: {err}")
+
+
+def _read_no_artifacts(lake):
+    """Read the cached run ids that are known to have no artifact"""
+    path = os.path.expanduser(f"{lake}/no_artifacts.json")
+    if not os.path.exists(path):
+        return set()
+    with open(path) as thefile:
+        return set(json.load(thefile))
+
+
+def _write_no_artifacts(lake, runids):
+    """Persist the no-artifact cache"""
+    try:
+        with open(os.path.expanduser(f"{lake}/no_artifacts.json"), "w") as thefile:
+            thefile.write(json.dumps(list(runids)))
+    except OSError as err:
+        print(f"Cannot write no-artifact cache: {err}")
+
+
+def _empty_forever(run_info):
+    """True when an empty artifact listing is final: the run is done and
+    GitHub already purged whatever it may have produced. A queued or
+    fresh run may still grow an artifact and must be asked again."""
+    if not run_info or run_info.get("status") != "completed":
+        return False
+    created_at = run_info.get("created_at")
+    if not created_at:
+        return False
+    try:
+        created = datetime.strptime(created_at, "%Y-%m-%dT%H:%M:%SZ")
+    except (TypeError, ValueError):
+        return False
+    return datetime.utcnow() - created > timedelta(days=_RETENTION_DAYS)
+
+
+def get_artifacts_for_runid(
+    runid,
+    run_number,
+    token,
+    lake,
+    user,
+    runner,
+    existing_zips=None,
+    etags=None,
+    no_artifacts=None,
+    run_info=None,
+):
+    """Download artifacts for a given runid.
+    With etags and no_artifacts the caller shares one cache across all
+    workers and persists it itself, otherwise the on-disk caches are
+    used directly. run_info is the run dict from the listing, it gates
+    the no-artifact cache on status and age.
+    """
+
+    # Runs that answered with an empty listing after their retention
+    # window passed will stay empty and need no request
+    shared_no_artifacts = no_artifacts is not None
+    if not shared_no_artifacts:
+        no_artifacts = _read_no_artifacts(lake)
+    if runid in no_artifacts:
+        print(f"Skipping run {runid}, known to have no artifact")
+        return None
     # Here we need the runid and we get the artifact id
 
     # manual example
@@ -86,18 +293,47 @@ def get_artifacts_for_runid(runid, run_number, token, lake, user, runner):
     # curl -H "Accept: application/vnd.github.v3+json" -u abelikt:$TOKEN
     # -L https://api.github.com/repos/abelikt/thin-edge.io/actions/runs/828065682/artifacts
 
-    url = f"https://api.github.com/repos/{user}/thin-edge.io/actions/runs/{runid}/artifacts"
-    headers = {"Accept": "application/vnd.github.v3+json"}
+    url = ARTIFACTS_URL.format(user=user, runid=runid)
+    # Copied since the conditional request below may add a header
+    headers = dict(HEADERS)
 
     auth = HTTPBasicAuth(user, token)
 
-    req = requests.get(url, auth=auth, headers=headers)
-    text = json.loads(req.text)
+    metadata_path = os.path.expanduser(
+        f"{lake}/{runner}_results_{run_number}_metadata.json"
+    )
+
+    # Conditional request: when we saw this listing before, ask GitHub
+    # to only send it again when it changed. A 304 answer does not
+    # count against the rate limit and we reuse the metadata file.
+    shared_etags = etags is not None
+    if not shared_etags:
+        etags = _read_etags(lake)
+    if url in etags and os.path.exists(metadata_path):
+        headers["If-None-Match"] = etags[url]
+
+    req = ratelimited_get(url, auth=auth, headers=headers)
 
-    with open(
-        os.path.expanduser(f"{lake}/{runner}_results_{run_number}_metadata.json"), "w"
-    ) as ofile:
-        ofile.write(json.dumps(text, indent=4))
+    if req.status_code == 304:
+        with open(metadata_path) as thefile:
+            text = json.load(thefile)
+    else:
+        text = req.json()
+
+        # Compact json, the file is internal and pretty printing
+        # inflates it three to five times
+        with open(metadata_path, "w") as ofile:
+            ofile.write(json.dumps(text))
+
+        etag = req.headers.get("ETag")
+        if etag:
+            if shared_etags:
+                # The shared cache is persisted once by the caller
+                with _CACHE_LOCK:
+                    etags[url] = str(etag)
+            else:
+                etags[url] = str(etag)
+                _write_etags(lake, etags)
 
     artifacts = text["artifacts"]
 
@@ -106,91 +342,244 @@ def get_artifacts_for_runid(runid, run_number, token, lake, user, runner):
         artifact_url = artifacts[0]["archive_download_url"]
         print(artifact_url)
         ret = download_artifact(
-            artifact_url, artifact_name, run_number, token, lake, user, runner
+            artifact_url,
+            artifact_name,
+            run_number,
+            token,
+            lake,
+            user,
+            runner,
+            existing_zips=existing_zips,
         )
         return ret
     else:
         print("No Artifact attached")
+        if _empty_forever(run_info):
+            if shared_no_artifacts:
+                # The shared cache is persisted once by the caller
+                with _CACHE_LOCK:
+                    no_artifacts.add(runid)
+            else:
+                no_artifacts.add(runid)
+                _write_no_artifacts(lake, no_artifacts)
 
     return None
 
 
-def get_all_runs(token, user):
+def _resolve_workflow_id(token, user, runner):
+    """Look up the workflow id for a workflow name.
+    Returns None when the workflow cannot be resolved, the callers then
+    fall back to filtering the full run listing by name.
+    """
+    url = WORKFLOWS_URL.format(user=user)
+    headers = HEADERS
+    auth = HTTPBasicAuth(user, token)
+
+    try:
+        req = ratelimited_get(url, auth=auth, headers=headers)
+        workflows = req.json()["workflows"]
+    except (requests.RequestException, KeyError, ValueError) as err:
+        print(f"Cannot resolve workflow id: {err}")
+        return None
+
+    for workflow in workflows:
+        if workflow["name"] == runner:
+            print(f"Workflow {runner} has id {workflow['id']}")
+            return workflow["id"]
+
+    print(f"No workflow named {runner} found")
+    return None
+
+
+def get_all_runs(token, user, workflow_id=None):
     """Download all GitHub Actions workflow runs.
     Generator function that returns the next 100 runs from the web-ui
-    as list of dictionaries.
+    as list of dictionaries. With a workflow id only the runs of that
+    workflow are listed, which saves the pages of all other workflows.
+
+    Hint: This stays on the paginated REST endpoint. The GraphQL API
+    does not expose Actions workflow runs, so the enumeration cannot be
+    batched into a single filtered query there.
     """
 
     # manual example
     # curl -H "Accept: application/vnd.github.v3+json" -u abelikt:$TOKEN
     # -L https://api.github.com/repos/abelikt/thin-edge.io/actions/runs
 
-    url = f"https://api.github.com/repos/{user}/thin-edge.io/actions/runs"
-    headers = {"Accept": "application/vnd.github.v3+json"}
+    if workflow_id:
+        url = WORKFLOW_RUNS_URL.format(user=user, workflow_id=workflow_id)
+    else:
+        url = RUNS_URL.format(user=user)
+    headers = HEADERS
 
     auth = HTTPBasicAuth("abelikt", token)
 
-    index = 1  # Hint: 0 and 1 seem to have an identical meaning when we request
-    empty = False
-
-    while not empty:
-        print(f"Request {index}")
-
+    def fetch(page):
         # larger values than 100 do not seem to have an effect
-        params = {"per_page": "100", "page": index}
-        req = requests.get(url, params=params, auth=auth, headers=headers)
-        stuff = json.loads(req.text)
+        params = {"per_page": "100", "page": page}
+        return ratelimited_get(url, params=params, auth=auth, headers=headers)
 
+    def parse(req):
+        stuff = req.json()
         try:
             read = len(stuff["workflow_runs"])
         except KeyError as kerror:
             print("Error", kerror, stuff)
             print("Error: Message from GitHub: ", stuff["message"])
             sys.exit(1)
-
-        if read == 0:
-            print("Empty")
-            return {}
-        else:
+        return stuff["workflow_runs"], read
+
+    # Hint: page 0 and 1 seem to have an identical meaning when we request
+    print("Request 1")
+    first = fetch(1)
+    runs, read = parse(first)
+
+    if read == 0:
+        print("Empty")
+        return
+    print(f"Read {read} entries")
+    yield runs
+
+    # The Link header of the first page tells us the total page count,
+    # so the remaining pages can be fetched concurrently and yielded in
+    # page order instead of one blocking round trip per page
+    last = first.links.get("last")
+
+    if last:
+        total_pages = int(parse_qs(urlparse(last["url"]).query)["page"][0])
+        print(f"Fetching pages 2 to {total_pages} concurrently")
+
+        # Keep at most one pool's worth of pages in flight. Submitting
+        # all pages at once means a consumer that stops early (watermark
+        # or run number one) still waits for and pays every remaining
+        # request on generator close.
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            pages = iter(range(2, total_pages + 1))
+            window = [executor.submit(fetch, page) for page in islice(pages, 8)]
+            try:
+                while window:
+                    req = window.pop(0).result()
+                    for page in islice(pages, 1):
+                        window.append(executor.submit(fetch, page))
+                    page_runs, read = parse(req)
+                    if read == 0:
+                        print("Empty")
+                        break
+                    print(f"Read {read} entries")
+                    yield page_runs
+            finally:
+                for future in window:
+                    future.cancel()
+    else:
+        # No pagination metadata, walk the pages one by one
+        index = 2
+        while True:
+            print(f"Request {index}")
+            req = fetch(index)
+            page_runs, read = parse(req)
+            if read == 0:
+                print("Empty")
+                return
             print(f"Read {read} entries")
-
-        index += 1
-        yield stuff["workflow_runs"]
-
-
-def get_all_system_test_runs(token, lake, user, runner):
-    """Returns als system test runs as list of run_id and number"""
-
-    system_test_runs = []
-    for test_runs in get_all_runs(token, user):
-        for test_run in test_runs:
-            if test_run["name"] == runner:
-                run_number = test_run["run_number"]
-                with open(
-                    os.path.expanduser(
-                        f"{lake}/{runner}_system_test_{run_number}_metadata.json"
-                    ),
-                    "w",
-                ) as ofile:
-                    ofile.write(json.dumps(test_run, indent=4))
-                print(
-                    f"Found System Test Run {test_run['name']} with id {test_run['id']}"
-                    f" run number {run_number} workflow id {test_run['workflow_id']}"
-                )
-                system_test_runs.append((test_run["id"], run_number))
-
-                if run_number == 1:
-                    # Multilevel break: Will hit for newer workflows with
-                    # smaller run numbers
-                    return system_test_runs
-                    print(f"Found {len(system_test_runs)} test_runs")
-
-    print(f"Found {len(system_test_runs)} test_runs")
-
-    return system_test_runs
-
-
-def main(lake, username):
+            index += 1
+            yield page_runs
+
+
+def _read_watermark(lake):
+    """Read the highest run number handled by the last complete run"""
+    path = os.path.expanduser(f"{lake}/watermark.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as thefile:
+        return json.load(thefile).get("max_seen_run_number")
+
+
+def _write_watermark(lake, run_number):
+    """Persist the pagination high-water mark"""
+    try:
+        with open(os.path.expanduser(f"{lake}/watermark.json"), "w") as thefile:
+            thefile.write(json.dumps({"max_seen_run_number": run_number}))
+    except OSError as err:
+        print(f"Cannot write watermark: {err}")
+
+
+def get_all_system_test_runs(token, lake, user, runner, verbose_metadata=False):
+    """Generator that yields all system test runs as (run_id, number)
+    tuples while the pagination is still in flight, so the caller can
+    start downloading before the enumeration finished"""
+
+    # With a resolved workflow id GitHub only lists matching runs and
+    # the name filter below turns into a no-op
+    workflow_id = _resolve_workflow_id(token, user, runner)
+
+    # Runs whose artifact is already in the lake need no API call at all
+    try:
+        existing = set(os.listdir(os.path.expanduser(lake)))
+    except FileNotFoundError:
+        existing = set()
+
+    # One consolidated log with one line per run replaces one metadata
+    # file write per run inside the enumeration loop. The per-run files
+    # are only rarely looked at, so they are gated behind a flag.
+    runs_log = None
+
+    # Everything at or below the watermark was handled by an earlier
+    # complete invocation, so pagination can stop there instead of
+    # walking to the end of the run history
+    watermark = _read_watermark(lake)
+
+    found = 0
+    try:
+        for test_runs in get_all_runs(token, user, workflow_id=workflow_id):
+            for test_run in test_runs:
+                if workflow_id or test_run["name"] == runner:
+                    run_number = test_run["run_number"]
+
+                    if watermark and int(run_number) <= watermark:
+                        print(f"Reached watermark at run number {run_number}")
+                        return
+
+                    if (
+                        f"results_{run_number}.zip" in existing
+                        or f"run_analytics_results_{run_number}.zip" in existing
+                    ):
+                        print(f"Skipping run {run_number}, artifact already in lake")
+                    else:
+                        if runs_log is None:
+                            runs_log = open(
+                                os.path.expanduser(f"{lake}/all_runs.jsonl"), "a"
+                            )
+                        runs_log.write(json.dumps(test_run) + "\n")
+
+                        if verbose_metadata:
+                            with open(
+                                os.path.expanduser(
+                                    f"{lake}/{runner}_system_test_{run_number}_metadata.json"
+                                ),
+                                "w",
+                            ) as ofile:
+                                ofile.write(json.dumps(test_run, indent=4))
+                        print(
+                            f"Found System Test Run {test_run['name']} with id {test_run['id']}"
+                            f" run number {run_number} workflow id {test_run['workflow_id']}"
+                        )
+                        found += 1
+                        # The full run dict rides along so the download
+                        # side can look at status and created_at
+                        yield (test_run["id"], run_number, test_run)
+
+                    if run_number == 1:
+                        # Multilevel break: Will hit for newer workflows with
+                        # smaller run numbers
+                        return
+
+        print(f"Found {found} test_runs")
+    finally:
+        if runs_log is not None:
+            runs_log.close()
+
+
+def main(lake, username, verbose_metadata=False):
     """main entry point"""
     token = None
     lake = os.path.expanduser(lake)
@@ -206,27 +595,93 @@ def main(lake, username):
     runner = 'run analytics'
 
     print(f'Getting logs for runner {runner}')
-    system_test_runs = get_all_system_test_runs(token, lake, username, runner)
 
+    # The downloads are almost pure network I/O, so run them with a
+    # bounded pool instead of one by one. The old skip counter early
+    # exit does not work with concurrent downloads, we just report the
+    # skips instead.
+    # One directory scan replaces one stat syscall per artifact below
+    try:
+        existing_zips = {
+            entry.name for entry in os.scandir(lake) if entry.name.endswith(".zip")
+        }
+    except FileNotFoundError:
+        existing_zips = set()
+
+    # One shared set of caches for all workers, persisted once at the
+    # end. Re-reading and re-writing the files per worker tears the json.
+    etags = _read_etags(lake)
+    no_artifacts = _read_no_artifacts(lake)
+
+    # The enumeration is a generator, downloads already start while
+    # later pages are still being listed
     skip_counter = 0
-    for run in system_test_runs:
-        print("Processing system test with runid {run[0]} and run number {run[1]}")
-        ret = get_artifacts_for_runid(run[0], run[1], token, lake, username, runner)
-        if ret == False:
-            skip_counter += 1
-
-        if skip_counter > 20:
-            print("Skipped already 20 times, lets hope we are done")
-            return
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = {}
+        for run in get_all_system_test_runs(
+            token, lake, username, runner, verbose_metadata=verbose_metadata
+        ):
+            print(f"Processing system test with runid {run[0]} and run number {run[1]}")
+            future = executor.submit(
+                get_artifacts_for_runid,
+                run[0],
+                run[1],
+                token,
+                lake,
+                username,
+                runner,
+                existing_zips=existing_zips,
+                etags=etags,
+                no_artifacts=no_artifacts,
+                run_info=run[2] if len(run) > 2 else None,
+            )
+            futures[future] = run
+
+        # Runs that answered "No Artifact attached" (None) must stay
+        # below the watermark so they are revisited, their artifact may
+        # simply not be uploaded yet
+        resolved = []
+        unresolved = []
+        for future in as_completed(futures):
+            ret = future.result()
+            if ret == False:
+                skip_counter += 1
+            if ret is None:
+                unresolved.append(int(futures[future][1]))
+            else:
+                resolved.append(int(futures[future][1]))
+
+    _write_etags(lake, etags)
+    _write_no_artifacts(lake, no_artifacts)
+
+    if skip_counter:
+        print(f"Skipped {skip_counter} existing artifacts")
+
+    # Only reached when every download worked out, the next invocation
+    # stops paginating at this run number. The watermark is the largest
+    # run number with no unresolved run below it, a higher mark would
+    # lock the unresolved runs out of the next enumeration.
+    if resolved:
+        mark = max(resolved)
+        if unresolved:
+            mark = min(mark, min(unresolved) - 1)
+        if mark > 0:
+            _write_watermark(lake, mark)
 
 
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument("username", type=str, help="GitHub Username")
+    parser.add_argument(
+        "--verbose-metadata",
+        action="store_true",
+        help="Also write one metadata json file per run",
+        required=False,
+    )
     args = parser.parse_args()
 
     user = args.username
     lake = "~/DataLake"
 
-    main(lake, user)
+    main(lake, user, verbose_metadata=args.verbose_metadata)
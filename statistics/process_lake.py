@@ -17,6 +17,7 @@ import logging
 import subprocess
 import os
 import os.path
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import databases as db
@@ -210,13 +211,22 @@ def generate(style, show, lake, testdata, earliest_valid):
 
     logging.info("Uploading")
 
-    cpu_array.update_table()
-    cpu_array_mosquitto.update_table()
-    cpu_array_long.update_table()
-    mem_array.update_table()
-    cpu_hist_array.update_table()
-    cpu_array_long_mosquitto.update_table()
-    measurements.update_table()
+    tables = [
+        cpu_array,
+        cpu_array_mosquitto,
+        cpu_array_long,
+        mem_array,
+        cpu_hist_array,
+        cpu_array_long_mosquitto,
+        measurements,
+    ]
+
+    # Update all tables concurrently so that the wall time is dominated
+    # by the slowest load job instead of the sum of all of them
+    with ThreadPoolExecutor() as executor:
+        futures = [executor.submit(table.update_table) for table in tables]
+        for future in futures:
+            future.result()
 
     logging.info("Done")
 
@@ -7,6 +7,8 @@ python -m pytest --capture=no test_databases.py
 import os
 import pytest
 
+from google.api_core.exceptions import GoogleAPIError
+
 import databases as db
 from databases import MeasurementBase
 
@@ -58,7 +60,7 @@ class TestMemoryHistory:
         base.update_table()
 
         assert base.job_config != None
-        assert base.json_data != None
+        assert base.columns != None
 
     def test_update_table_calls_upload(self, mocker):
         base = db.MemoryHistory(None, "name", 3, 10, None, None)
@@ -79,7 +81,9 @@ class TestMemoryHistory:
 
         base = db.MemoryHistory(lake, "name", 3, 10, None, None)
         mock = mocker.patch.object(base, "scrap_data")
-        ex_mock = mocker.patch("os.path.exists", return_value=True)
+        ex_mock = mocker.patch(
+            "databases.list_output_files", return_value=({"filename.out"}, set())
+        )
 
         folders = [
             "results_1_unpack",
@@ -111,7 +115,13 @@ class TestMemoryHistory:
         mock_c = mocker.patch.object(base, "scrap_data_collectd")
 
         ex_mock = mocker.patch(
-            "os.path.exists", side_effect=[True, True, True, False, True]
+            "databases.list_output_files",
+            side_effect=[
+                ({"filename.out"}, set()),
+                ({"filename.out"}, set()),
+                ({"filename.out"}, set()),
+                (set(), {"gauge-mapper-c8y-resident.rrd.txt"}),
+            ],
         )
 
         folders = [
@@ -217,7 +227,13 @@ class TestCpuHistory:
         mock_c = mocker.patch.object(base, "scrap_data_collectd")
 
         ex_mock = mocker.patch(
-            "os.path.exists", side_effect=[True, True, True, False, True]
+            "databases.list_output_files",
+            side_effect=[
+                ({"stat_mapper_stdout.out"}, set()),
+                ({"stat_mapper_stdout.out"}, set()),
+                ({"stat_mapper_stdout.out"}, set()),
+                (set(), {"gauge-mapper-c8y-utime.rrd.txt"}),
+            ],
         )
 
         folders = [
@@ -291,7 +307,7 @@ class TestCpuHistoryStacked:
         base.update_table()
 
         assert base.job_config != None
-        assert base.json_data != None
+        assert base.columns != None
         assert base.database != None
 
     def test_postprocess(self):
@@ -331,7 +347,7 @@ class TestMetadata:
         base.update_table()
 
         assert base.job_config != None
-        assert base.json_data != None
+        assert base.columns != None
 
     def test_show_metadata(self, mocker):
         lake = os.path.expanduser("~/DataLakeTest")
@@ -357,24 +373,22 @@ class TestMetadata:
         metadata = db.MeasurementMetadata(
             lake, "ci_measurements", 3, 10, client, testmode
         )
-        metadata.json_data = {"nope": "nope"}
+        metadata.columns = {"nope": ["nope"]}
         metadata.job_config = None
 
         # With this we inject a mock chain
-        # load_table_from_json is called, it returns a load_job
-        # load_job.running() returns False
+        # load_table_from_file is called, it returns a load_job
+        # load_job.result() waits for the job
         load_mock = mocker.MagicMock(name="load_job")
-        load_mock.running = mocker.MagicMock(name="running", return_value=False)
-        load_mock.errors = False
         load_table_mock = mocker.MagicMock(
-            name="load_table_from_json", return_value=load_mock
+            name="load_table_from_file", return_value=load_mock
         )
         mocker.patch.object(metadata, "client")
-        metadata.client.load_table_from_json = load_table_mock
+        metadata.client.load_table_from_file = load_table_mock
 
         metadata.upload_table()
 
-        metadata.client.load_table_from_json.assert_called_once()
+        metadata.client.load_table_from_file.assert_called_once()
 
     def test_upload_table_errors(self, mocker):
         """"""
@@ -384,23 +398,23 @@ class TestMetadata:
         metadata = db.MeasurementMetadata(
             lake, "ci_measurements", 3, 10, client, testmode
         )
-        metadata.json_data = {"nope": "nope"}
+        metadata.columns = {"nope": ["nope"]}
         metadata.job_config = None
 
         # With this we inject a mock chain
-        # load_table_from_json is called, it returns a load_job
-        # load_job.running() returns False
+        # load_table_from_file is called, it returns a load_job
+        # load_job.result() raises for a failed job
         load_mock = mocker.MagicMock(name="load_job")
-        load_mock.running = mocker.MagicMock(name="running", return_value=False)
-
-        load_mock.errors = True
+        load_mock.result = mocker.MagicMock(
+            name="result", side_effect=GoogleAPIError("nope")
+        )
         load_mock.error_results = "Error results"
 
         load_table_mock = mocker.MagicMock(
-            name="load_table_from_json", return_value=load_mock
+            name="load_table_from_file", return_value=load_mock
         )
         mocker.patch.object(metadata, "client")
-        metadata.client.load_table_from_json = load_table_mock
+        metadata.client.load_table_from_file = load_table_mock
 
         with pytest.raises(SystemError):
             metadata.upload_table()
@@ -414,29 +428,22 @@ class TestMetadata:
             lake, "ci_measurements", 3, 10, client, testmode
         )
 
-        metadata.json_data = {"nope": "nope"}
+        metadata.columns = {"nope": ["nope"]}
         metadata.job_config = None
 
-        mocker.patch("time.sleep")
-
         # With this we inject a mock chain
-        # load_table_from_json is called, it returns a load_job
-        # load_job.running() returns False
+        # load_table_from_file is called, it returns a load_job
+        # load_job.result() waits for the job with its own backoff
         load_mock = mocker.MagicMock(name="load_job")
-        load_mock.running = mocker.MagicMock(
-            name="running", side_effect=[True, True, True, False]
-        )
-
-        load_mock.errors = False
 
         load_table_mock = mocker.MagicMock(
-            name="load_table_from_json", return_value=load_mock
+            name="load_table_from_file", return_value=load_mock
         )
         mocker.patch.object(metadata, "client")
-        metadata.client.load_table_from_json = load_table_mock
+        metadata.client.load_table_from_file = load_table_mock
 
         metadata.upload_table()
-        assert load_mock.running.call_count == 4
+        load_mock.result.assert_called_once_with(timeout=600)
 
     def test_upload_metadata_b(self, mocker):
         """"""
@@ -15,9 +15,18 @@ class TestDownloadArtifacts:
         ]
 
         calls = [
-            mocker.call("788264906", "91", token, lake, user, runner),
-            mocker.call("789260232", "92", token, lake, user, runner),
-            mocker.call("789311136", "93", token, lake, user, runner),
+            mocker.call(
+                "788264906", "91", token, lake, user, runner,
+                existing_zips=set(), etags={}, no_artifacts=set(), run_info=None,
+            ),
+            mocker.call(
+                "789260232", "92", token, lake, user, runner,
+                existing_zips=set(), etags={}, no_artifacts=set(), run_info=None,
+            ),
+            mocker.call(
+                "789311136", "93", token, lake, user, runner,
+                existing_zips=set(), etags={}, no_artifacts=set(), run_info=None,
+            ),
         ]
 
         runmock = mocker.patch("download_all_artifacts.get_artifacts_for_runid")
@@ -29,7 +38,7 @@ class TestDownloadArtifacts:
 
         assert runmock.call_count == len(runs)
         runmock.assert_has_calls(calls, any_order=True)
-        smock.assert_called_with(token, lake, user, runner)
+        smock.assert_called_with(token, lake, user, runner, verbose_metadata=False)
 
     def test_get_all_runs_empty(self, mocker):
 
@@ -38,8 +47,10 @@ class TestDownloadArtifacts:
         user = "user"
         url = "https://api.github.com/repos/user/thin-edge.io/actions/runs"
         reqmock = mocker.MagicMock(name="reqmock")
-        reqmock.text = '{"workflow_runs":{}}'
-        rmock = mocker.patch("requests.get", return_value=reqmock)
+        reqmock.json.return_value = {"workflow_runs": {}}
+        reqmock.headers = {}
+        reqmock.links = {}
+        rmock = mocker.patch.object(da.SESSION, "get", return_value=reqmock)
 
         ret = da.get_all_runs(token, user)
 
@@ -58,11 +69,15 @@ class TestDownloadArtifacts:
         url = "https://api.github.com/repos/user/thin-edge.io/actions/runs"
 
         reqmock = mocker.MagicMock(name="reqmock")
-        reqmock.text = '{"workflow_runs":{ "one":"one", "two":"two"}}'
+        reqmock.json.return_value = {"workflow_runs": {"one": "one", "two": "two"}}
+        reqmock.headers = {}
+        reqmock.links = {}
         reqmock2 = mocker.MagicMock(name="reqmock2")
-        reqmock2.text = '{"workflow_runs":{}}'
+        reqmock2.json.return_value = {"workflow_runs": {}}
+        reqmock2.headers = {}
+        reqmock2.links = {}
 
-        rmock = mocker.patch("requests.get", side_effect=[reqmock, reqmock2])
+        rmock = mocker.patch.object(da.SESSION, "get", side_effect=[reqmock, reqmock2])
         ret = da.get_all_runs(token, user)
 
         # Hint: this call finally runs the generator get_all runs
@@ -79,9 +94,11 @@ class TestDownloadArtifacts:
         mocker.patch(
             "download_all_artifacts.get_all_runs", return_value=[[{"name": "myname"}]]
         )
+        mocker.patch("download_all_artifacts._resolve_workflow_id", return_value=None)
         ret = da.get_all_system_test_runs("token", "lake", "user", runner)
 
-        assert ret == []
+        # Hint: this call finally runs the generator
+        assert list(ret) == []
 
     def test_get_all_system_test_runs_one(self, mocker):
         inject = [
@@ -98,6 +115,7 @@ class TestDownloadArtifacts:
         getmock = mocker.patch(
             "download_all_artifacts.get_all_runs", return_value=inject
         )
+        mocker.patch("download_all_artifacts._resolve_workflow_id", return_value=None)
         lake = "lake"
         user = "user"
         runner = "system-test-workflow"
@@ -107,22 +125,23 @@ class TestDownloadArtifacts:
 
         ret = da.get_all_system_test_runs("token", lake, user, runner)
 
-        assert ret == [
+        # Hint: this call finally runs the generator
+        assert list(ret) == [
             (
                 "456",
                 "123",
+                inject[0][0],
             )
         ]
-        getmock.assert_called_with("token", "user")
+        getmock.assert_called_with("token", "user", workflow_id=None)
 
     def test_get_artifacts_for_runid_no_artifacts(self, mocker):
         inject = {"artifacts": []}
         dmock = mocker.patch("download_all_artifacts.download_artifact")
         mocker.patch("__main__.open")
-        mocker.patch("requests.get")
-        # instead of fiddling around with the return value of requests.get
-        # we just patch json.loads
-        mocker.patch("json.loads", return_value=inject)
+        reqmock = mocker.patch.object(da.SESSION, "get")
+        reqmock.return_value.headers = {}
+        reqmock.return_value.json.return_value = inject
         runid = 42
         run_number = 43
         token = "token"
@@ -138,10 +157,9 @@ class TestDownloadArtifacts:
         inject = {"artifacts": [{"name": "bob", "archive_download_url": "theurl"}]}
         dmock = mocker.patch("download_all_artifacts.download_artifact")
         mocker.patch("__main__.open")
-        reqmock = mocker.patch("requests.get")
-        # instead of fiddling around with the return value of requests.get
-        # we just patch json.loads
-        mocker.patch("json.loads", return_value=inject)
+        reqmock = mocker.patch.object(da.SESSION, "get")
+        reqmock.return_value.headers = {}
+        reqmock.return_value.json.return_value = inject
         runid = 42
         run_number = 43
         token = "token"
@@ -153,7 +171,9 @@ class TestDownloadArtifacts:
 
         da.get_artifacts_for_runid(runid, run_number, token, lake, user, runner)
 
-        dmock.assert_called_once_with("theurl", "bob", 43, token, lake, user, runner)
+        dmock.assert_called_once_with(
+            "theurl", "bob", 43, token, lake, user, runner, existing_zips=None
+        )
         reqmock.assert_called_with(url, auth=mocker.ANY, headers=mocker.ANY)
 
     def test_download_artifact(self, mocker):
@@ -165,8 +185,10 @@ class TestDownloadArtifacts:
         lake = "lake"
         user = "user"
         runner = "system-test-workflow"
-        rmock = mocker.patch("requests.get")
+        rmock = mocker.patch.object(da.SESSION, "get")
+        rmock.return_value.headers = {}
         mocker.patch("os.path.exists", return_value=False)
+        mocker.patch("os.replace")
         mocker.patch("download_all_artifacts.open")
 
         da.download_artifact(url, name, run_number, token, lake, user, runner)
@@ -179,3 +201,30 @@ class TestDownloadArtifacts:
             headers=mocker.ANY,
             stream=True,
         )
+
+    def test_download_artifact_complete_part(self, mocker):
+        """A resume of an already complete part file answers 416, the
+        part file is swapped in place instead of raising"""
+
+        url = "theurl"
+        run_number = 2
+        name = "results_"
+        token = "token"
+        lake = "lake"
+        user = "user"
+        runner = "system-test-workflow"
+        rmock = mocker.patch.object(da.SESSION, "get")
+        rmock.return_value.headers = {}
+        rmock.return_value.status_code = 416
+        # Only the part file exists, with some bytes in it
+        mocker.patch("os.path.exists", side_effect=lambda path: path.endswith(".part"))
+        mocker.patch("os.path.getsize", return_value=1234)
+        replace_mock = mocker.patch("os.replace")
+        mocker.patch("download_all_artifacts.open")
+
+        ret = da.download_artifact(url, name, run_number, token, lake, user, runner)
+
+        assert ret == True
+        replace_mock.assert_called_once_with(
+            "lake/results_2.zip.part", "lake/results_2.zip"
+        )